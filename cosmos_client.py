@@ -15,20 +15,108 @@ Examples:
   python3 cosmos_client.py test
 """
 
+import argparse
+import asyncio
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import base64
+import hashlib
+import json
+import mmap
+import os
 import sys
+import shutil
+import socket
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from urllib.parse import quote, unquote
 import re
 import yaml
 
+try:
+    import httpx  # optional, only needed for AsyncCosmosClient
+except ImportError:
+    httpx = None
+
+try:
+    import orjson  # optional, faster JSON encoding/decoding
+except ImportError:
+    orjson = None
+
 # Configuration
 WORKSTATION_IP = "10.0.0.46"
-API_URL = f"http://{WORKSTATION_IP}:8000/v1/chat/completions"
 
 # Supported file types
 VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mov', '.mkv', '.webm']
 IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.webp', '.gif']
+VIDEO_EXT = frozenset(VIDEO_EXTENSIONS)
+IMAGE_EXT = frozenset(IMAGE_EXTENSIONS)
+
+# MIME types for images (all videos are sent as video/mp4)
+MIME_MAP = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.webp': 'image/webp',
+    '.gif': 'image/gif'
+}
+
+# Read size for base64 encoding - 57 KiB, a multiple of 3 so chunks encode without padding
+ENCODE_CHUNK_SIZE = 57 * 1024
+
+# Stands in for the data URI when serializing a request whose file is streamed
+FILE_URL_PLACEHOLDER = "__COSMOS_FILE_URL__"
+
+# Reasoning sections in model responses
+THINK_RE = re.compile(r'<think>(.*?)</think>', re.DOTALL | re.IGNORECASE)
+ANSWER_RE = re.compile(r'<answer>(.*?)</answer>', re.DOTALL | re.IGNORECASE)
+
+# On-disk response cache for deterministic (temperature 0) requests
+CACHE_DIR = Path("~/.cache/cosmos_reason2").expanduser()
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Fail fast if the server is unreachable, but give inference time to finish
+REQUEST_TIMEOUT = (5, 180)  # (connect, read) seconds
+
+# Retry policy for transient server errors, shared by both clients
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.5  # seconds, doubled on each retry
+RETRY_STATUSES = (500, 502, 503, 504)
+
+# Shared HTTP session - keeps connections to the server alive between requests.
+# Transient server errors (e.g. while vLLM is loading the model or its queue is
+# full) are retried with exponential backoff. Request bodies, including
+# StreamingRequestBody, can be resent. Read errors are not retried: the server
+# may already be running inference, and a retry would repeat the full read timeout.
+SESSION = requests.Session()
+SESSION.headers["Connection"] = "keep-alive"
+SESSION.mount("http://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=RETRY_TOTAL,
+        read=False,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["POST", "GET"]),
+        raise_on_status=False
+    )
+))
+
+def json_dumps(obj):
+    """Serialize obj to JSON bytes, with orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+def json_loads(data):
+    """Parse JSON from bytes or str, with orjson when available"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
 def load_yaml_prompt(yaml_path):
     """Load prompt from YAML file"""
@@ -46,8 +134,8 @@ def load_yaml_prompt(yaml_path):
 
 def parse_reasoning(content):
     """Parse <think> and <answer> sections from response if present"""
-    think_match = re.search(r'<think>(.*?)</think>', content, re.DOTALL | re.IGNORECASE)
-    answer_match = re.search(r'<answer>(.*?)</answer>', content, re.DOTALL | re.IGNORECASE)
+    think_match = THINK_RE.search(content)
+    answer_match = ANSWER_RE.search(content)
     
     if think_match and answer_match:
         thinking = think_match.group(1).strip()
@@ -78,23 +166,475 @@ def display_result(content, show_reasoning=True):
         print(answer)
         print("=" * 70)
 
-def process_file(file_path, prompt=None, yaml_file=None, show_reasoning=True):
-    """Process video or image file with Cosmos Reason 2"""
+class StreamingRequestBody:
+    """JSON request body with a file streamed into it as a base64 data URI.
+    
+    Iterating yields the JSON up to the URL field, then the file encoded
+    chunk by chunk, then the rest of the JSON - so only one chunk is ever
+    held in memory instead of the raw file, its base64 copy and the
+    serialized JSON string. The body can be iterated again if the request
+    is retried.
+    
+    view is a mapping of the file's contents (see map_file), which must stay
+    open until the request has been sent.
+    """
+    
+    def __init__(self, request_data, mime_type, view):
+        prefix, suffix = json_dumps(request_data).split(FILE_URL_PLACEHOLDER.encode())
+        self.prefix = b"".join((prefix, b"data:", mime_type.encode(), b";base64,"))
+        self.suffix = suffix
+        self.view = view
+        self.encoded_size = -(-len(view) // 3) * 4
+    
+    def __len__(self):
+        # Lets requests send a Content-Length header instead of chunked encoding
+        return len(self.prefix) + self.encoded_size + len(self.suffix)
+    
+    def __iter__(self):
+        yield self.prefix
+        for start in range(0, len(self.view), ENCODE_CHUNK_SIZE):
+            yield base64.b64encode(self.view[start:start + ENCODE_CHUNK_SIZE])
+        yield self.suffix
+    
+    async def aiter_chunks(self):
+        """The same chunks as an async generator, for httpx.AsyncClient"""
+        for chunk in self:
+            yield chunk
+
+class _SingleFileHandler(BaseHTTPRequestHandler):
+    """Serves the one file registered on the server, nothing else"""
+    
+    def do_GET(self):
+        file_path, mime_type = self.server.file_path, self.server.mime_type
+        if unquote(self.path.lstrip('/')) != file_path.name:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", mime_type)
+        self.send_header("Content-Length", str(file_path.stat().st_size))
+        self.end_headers()
+        with open(file_path, "rb") as f:
+            shutil.copyfileobj(f, self.wfile)
+    
+    def log_message(self, format, *args):
+        pass
+
+def local_ip_for(host):
+    """Find the local address the server at host will see us connecting from"""
+    # Connecting a UDP socket only picks a route; nothing is sent, so any port works
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.connect((host, 80))
+        return s.getsockname()[0]
+
+@contextmanager
+def serve_file(file_path, mime_type, server_host=WORKSTATION_IP):
+    """Serve a file over a short-lived HTTP server and yield its URL.
+    
+    vLLM downloads the raw bytes itself, so nothing has to be base64-encoded.
+    The server must be able to reach this machine on an ephemeral port.
+    """
+    # Listen only on the interface the server reaches us through
+    host = local_ip_for(server_host)
+    httpd = ThreadingHTTPServer((host, 0), _SingleFileHandler)
+    httpd.file_path = file_path.resolve()
+    httpd.mime_type = mime_type
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{httpd.server_port}/{quote(file_path.name)}"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+@contextmanager
+def map_file(file_path):
+    """Yield a read-only memoryview of a file's contents, backed by mmap
+    
+    Hashing and encoding can both read from the same mapping, so the file
+    comes from the page cache once instead of being read into new bytes
+    objects for each pass.
+    """
+    with open(file_path, "rb") as f:
+        # Empty files can't be mapped
+        if not os.fstat(f.fileno()).st_size:
+            yield memoryview(b"")
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            yield view
+
+def hash_view(view):
+    """SHA-256 of a memoryview's contents, without copying"""
+    hasher = hashlib.sha256()
+    for start in range(0, len(view), HASH_CHUNK_SIZE):
+        hasher.update(view[start:start + HASH_CHUNK_SIZE])
+    return hasher.hexdigest()
+
+def hash_file(file_path):
+    """SHA-256 of a file's contents"""
+    with map_file(file_path) as view:
+        return hash_view(view)
+
+def cache_key(file_hash, request_data):
+    """Cache key for a request: the file's hash plus a hash of everything else sent"""
+    # Always stdlib json, so keys don't depend on whether orjson is installed
+    request_json = json.dumps(request_data, sort_keys=True).encode()
+    return f"{file_hash}_{hashlib.sha256(request_json).hexdigest()}"
+
+def load_cached_response(key):
+    """Return the cached response content for key, or None on a miss"""
+    try:
+        with open(CACHE_DIR / f"{key}.json", 'r') as f:
+            return json.load(f)['content']
+    except (OSError, ValueError, KeyError):
+        return None
+
+def save_cached_response(key, content):
+    """Store response content under key (best effort)"""
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # Write then rename so concurrent readers never see a partial file
+        tmp_path = CACHE_DIR / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'content': content}, f)
+        os.replace(tmp_path, CACHE_DIR / f"{key}.json")
+    except OSError:
+        pass
+
+class StreamError(Exception):
+    """Error frame sent by the server after a streamed response has started"""
+
+def parse_stream_line(line):
+    """Content delta from one server-sent events line of a streamed response (None if none)
+    
+    Raises StreamError if the server reports an error mid-stream.
+    """
+    if not line.startswith("data:"):
+        return None
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return None
+    event = json_loads(data)
+    if 'error' in event:
+        error = event['error']
+        raise StreamError(error.get('message', error) if isinstance(error, dict) else error)
+    choices = event.get('choices') or [{}]
+    return choices[0].get('delta', {}).get('content')
+
+def build_request(system_prompt, user_prompt, file_type, file_url, max_tokens=4096, temperature=0.7):
+    """Build the chat completions request body for a single image or video
+    
+    The text prompt goes before the file so that requests sharing a prompt
+    also share a token prefix, which vLLM's prefix cache can reuse instead of
+    prefilling it again. Keep system_prompt and user_prompt byte-identical
+    across calls (no paths or timestamps).
+    
+    Decoding time grows with the number of tokens generated, so keep
+    max_tokens low for short answers. temperature=0 makes responses
+    deterministic, which also makes them cacheable.
+    """
+    content = [
+        {"type": "text", "text": user_prompt},
+        {
+            "type": f"{file_type}_url",
+            f"{file_type}_url": {"url": file_url}
+        }
+    ]
+    
+    return {
+        "model": "nvidia/Cosmos-Reason2-2B",
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": content}
+        ],
+        "max_tokens": max_tokens,
+        "temperature": temperature
+    }
+
+class CosmosClient:
+    """Client for a Cosmos Reason 2 vLLM server
+    
+    All clients share SESSION, so connections stay alive and are reused
+    across requests and threads.
+    """
+    
+    def __init__(self, host=WORKSTATION_IP, port=8000):
+        self.host = host
+        self.port = port
+        self.base_url = f"http://{host}:{port}/v1"
+        self.session = SESSION
+    
+    def chat(self, request_data, stream=False, stop_when=None):
+        """Send a chat completions request and return the response content (None on error)
+        
+        request_data is a request dict, already serialized JSON bytes, or a
+        StreamingRequestBody. Set
+        stream=True if the request asks for a streamed response; then
+        stop_when(content_so_far) can end it early by returning True, which
+        closes the connection so the server stops generating.
+        """
+        url = f"{self.base_url}/chat/completions"
+        try:
+            if isinstance(request_data, dict):
+                request_data = json_dumps(request_data)
+            response = self.session.post(
+                url,
+                data=request_data,
+                headers={"Content-Type": "application/json"},
+                timeout=REQUEST_TIMEOUT,
+                stream=stream
+            )
+            
+            if not stream:
+                response.raise_for_status()
+                result = json_loads(response.content)
+                return result['choices'][0]['message']['content']
+            
+            with response:
+                response.raise_for_status()
+                content = ""
+                for line in response.iter_lines(decode_unicode=True):
+                    content += parse_stream_line(line) or ""
+                    if stop_when and stop_when(content):
+                        break
+                return content
+            
+        except requests.exceptions.ConnectionError:
+            print(f"❌ Error: Cannot connect to server at {self.host}:{self.port}")
+            print("   Make sure the vLLM server is running on your workstation.")
+            return None
+        except requests.exceptions.Timeout:
+            print("❌ Error: Request timed out.")
+            return None
+        except requests.exceptions.HTTPError as e:
+            print(f"❌ HTTP Error: {e}")
+            return None
+        except StreamError as e:
+            print(f"❌ Server Error: {e}")
+            return None
+        except KeyError as e:
+            print(f"❌ Error parsing response: {e}")
+            return None
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            return None
+    
+    def chat_file(self, request_data, file_path, mime_type, binary=False, use_cache=True, file_hash=None,
+                  stop_when=None):
+        """Send a request about one file and return the response content (None on error)
+        
+        request_data must use FILE_URL_PLACEHOLDER as the file's URL. The file
+        is streamed as base64 (see StreamingRequestBody), or with binary=True
+        served for the server to download (see serve_file).
+        
+        Responses are cached on disk by file hash + request, but only when the
+        temperature is 0 - otherwise the response is not reproducible. Pass
+        file_hash if the file has already been hashed to avoid reading it again.
+        
+        Streamed requests ("stream": true) can be cut short with stop_when, see chat().
+        """
+        cacheable = use_cache and request_data.get("temperature") == 0
+        stream = request_data.get("stream", False)
+        if binary:
+            if cacheable:
+                try:
+                    file_hash = file_hash or hash_file(file_path)
+                except OSError as e:
+                    print(f"❌ Error reading file: {e}")
+                    return None
+                key = cache_key(file_hash, request_data)
+                content = load_cached_response(key)
+                if content is not None:
+                    print(f"💾 Using cached response for {file_path.name}")
+                    return content
+            
+            # The file server stays up until the response arrives
+            try:
+                with serve_file(file_path, mime_type, self.host) as file_url:
+                    request_json = json_dumps(request_data).replace(
+                        FILE_URL_PLACEHOLDER.encode(), file_url.encode()
+                    )
+                    content = self.chat(request_json, stream, stop_when)
+            except OSError as e:
+                print(f"❌ Error serving file: {e}")
+                return None
+        else:
+            # One mapping feeds both the cache key hash and the upload
+            try:
+                with map_file(file_path) as view:
+                    if cacheable:
+                        key = cache_key(file_hash or hash_view(view), request_data)
+                        content = load_cached_response(key)
+                        if content is not None:
+                            print(f"💾 Using cached response for {file_path.name}")
+                            return content
+                    
+                    content = self.chat(
+                        StreamingRequestBody(request_data, mime_type, view), stream, stop_when
+                    )
+            except OSError as e:
+                print(f"❌ Error reading file: {e}")
+                return None
+        
+        # Never cache an empty answer; it is more likely a failure than a response
+        if cacheable and content:
+            save_cached_response(key, content)
+        return content
+    
+    def list_models(self):
+        """Return the models served by the server"""
+        response = self.session.get(f"{self.base_url}/models", timeout=5)
+        response.raise_for_status()
+        return json_loads(response.content).get('data', [])
+
+class AsyncCosmosClient:
+    """Asynchronous client for a Cosmos Reason 2 vLLM server (requires httpx)
+    
+    Wraps a single httpx.AsyncClient, so any number of concurrent requests
+    share one pool of keep-alive connections. Use as an async context
+    manager so the pool is closed afterwards.
+    """
+    
+    def __init__(self, host=WORKSTATION_IP, port=8000, max_connections=32):
+        if httpx is None:
+            raise ImportError("AsyncCosmosClient requires httpx: pip install httpx")
+        self.host = host
+        self.port = port
+        self.base_url = f"http://{host}:{port}/v1"
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=16),
+            timeout=httpx.Timeout(300, connect=REQUEST_TIMEOUT[0])
+        )
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.client.aclose()
+    
+    async def chat(self, body, stream=False, stop_when=None):
+        """Send a chat completions request with a StreamingRequestBody (see CosmosClient.chat)"""
+        try:
+            # Retry transient server errors like the sync session does; each
+            # attempt needs a fresh iterator over the body
+            for attempt in range(RETRY_TOTAL + 1):
+                request = self.client.build_request(
+                    "POST",
+                    f"{self.base_url}/chat/completions",
+                    content=body.aiter_chunks(),
+                    headers={"Content-Type": "application/json", "Content-Length": str(len(body))}
+                )
+                response = await self.client.send(request, stream=stream)
+                if response.status_code not in RETRY_STATUSES or attempt == RETRY_TOTAL:
+                    break
+                await response.aclose()
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+            
+            if not stream:
+                response.raise_for_status()
+                result = json_loads(response.content)
+                return result['choices'][0]['message']['content']
+            
+            try:
+                response.raise_for_status()
+                content = ""
+                async for line in response.aiter_lines():
+                    content += parse_stream_line(line) or ""
+                    if stop_when and stop_when(content):
+                        break
+                return content
+            finally:
+                await response.aclose()
+            
+        except httpx.ConnectError:
+            print(f"❌ Error: Cannot connect to server at {self.host}:{self.port}")
+            print("   Make sure the vLLM server is running on your workstation.")
+            return None
+        except httpx.TimeoutException:
+            print("❌ Error: Request timed out.")
+            return None
+        except httpx.HTTPStatusError as e:
+            print(f"❌ HTTP Error: {e}")
+            return None
+        except StreamError as e:
+            print(f"❌ Server Error: {e}")
+            return None
+        except KeyError as e:
+            print(f"❌ Error parsing response: {e}")
+            return None
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            return None
+    
+    async def chat_file(self, request_data, file_path, mime_type, use_cache=True, file_hash=None,
+                        stop_when=None):
+        """Async version of CosmosClient.chat_file (base64 upload only)"""
+        cacheable = use_cache and request_data.get("temperature") == 0
+        stream = request_data.get("stream", False)
+        try:
+            with map_file(file_path) as view:
+                if cacheable:
+                    # Hash in a worker thread so large files don't stall the event loop
+                    if file_hash is None:
+                        file_hash = await asyncio.to_thread(hash_view, view)
+                    key = cache_key(file_hash, request_data)
+                    content = load_cached_response(key)
+                    if content is not None:
+                        print(f"💾 Using cached response for {file_path.name}")
+                        return content
+                
+                content = await self.chat(
+                    StreamingRequestBody(request_data, mime_type, view), stream, stop_when
+                )
+        except OSError as e:
+            print(f"❌ Error reading file: {e}")
+            return None
+        
+        # Never cache an empty answer; it is more likely a failure than a response
+        if cacheable and content:
+            save_cached_response(key, content)
+        return content
+
+# Default client for the configured workstation
+CLIENT = CosmosClient()
+
+def process_file(file_path, prompt=None, yaml_file=None, show_reasoning=True, binary=False, use_cache=True,
+                 max_tokens=4096, temperature=0.7, client=None):
+    """Process video or image file with Cosmos Reason 2
+    
+    By default the file is sent inline as a base64 data URI, encoded chunk by
+    chunk while the request body is uploaded (see StreamingRequestBody), so
+    memory use stays constant regardless of file size.
+    
+    With binary=True the file is instead served over a short-lived local HTTP
+    server and vLLM fetches the raw bytes from it, avoiding base64 entirely
+    (33% less data on the wire, no client-side encoding).
+    
+    Deterministic requests are answered from the local response cache when
+    possible; pass use_cache=False to always query the server.
+    
+    Requests go to client, or the configured workstation (CLIENT) by default.
+    """
+    client = client or CLIENT
     
     file_path = Path(file_path)
     
-    if not file_path.exists():
+    try:
+        file_size = file_path.stat().st_size
+    except (FileNotFoundError, NotADirectoryError):
         print(f"❌ Error: File not found: {file_path}")
         return None
+    except OSError as e:
+        print(f"❌ Error reading file: {e}")
+        return None
     
     # Determine file type
     ext = file_path.suffix.lower()
     
-    if ext in VIDEO_EXTENSIONS:
+    if ext in VIDEO_EXT:
         file_type = 'video'
         default_prompt = "Caption this video in detail."
         print(f"📹 Processing video: {file_path.name}")
-    elif ext in IMAGE_EXTENSIONS:
+    elif ext in IMAGE_EXT:
         file_type = 'image'
         default_prompt = "Describe this image in detail."
         print(f"🖼️  Processing image: {file_path.name}")
@@ -102,37 +642,21 @@ def process_file(file_path, prompt=None, yaml_file=None, show_reasoning=True):
         print(f"❌ Error: Unsupported file type: {ext}")
         return None
     
-    # Read and encode file
-    print("📦 Encoding file...")
-    try:
-        with open(file_path, "rb") as f:
-            file_data = f.read()
-            file_size_mb = len(file_data) / (1024 * 1024)
-            print(f"   File size: {file_size_mb:.2f} MB")
-            data_b64 = base64.b64encode(file_data).decode()
-    except Exception as e:
-        print(f"❌ Error reading file: {e}")
-        return None
-    
-    # Build content based on file type
+    # Determine MIME type
     if file_type == 'video':
-        content_item = {
-            "type": "video_url",
-            "video_url": {"url": f"data:video/mp4;base64,{data_b64}"}
-        }
+        mime_type = 'video/mp4'
     else:
-        mime_map = {
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.png': 'image/png',
-            '.webp': 'image/webp',
-            '.gif': 'image/gif'
-        }
-        mime_type = mime_map.get(ext, 'image/jpeg')
-        content_item = {
-            "type": "image_url",
-            "image_url": {"url": f"data:{mime_type};base64,{data_b64}"}
-        }
+        mime_type = MIME_MAP.get(ext, 'image/jpeg')
+    
+    file_size_mb = file_size / (1024 * 1024)
+    
+    # Read and encode file (or serve it directly)
+    if binary:
+        print("📡 Serving file for direct download by the server...")
+        print(f"   File size: {file_size_mb:.2f} MB")
+    else:
+        print("📦 Encoding file (streamed during upload)...")
+        print(f"   File size: {file_size_mb:.2f} MB")
     
     # Determine prompts
     if yaml_file:
@@ -145,24 +669,7 @@ def process_file(file_path, prompt=None, yaml_file=None, show_reasoning=True):
         system_prompt = "You are a helpful assistant that analyzes images and videos."
         user_prompt = prompt if prompt else default_prompt
     
-    # Build API request
-    request_data = {
-        "model": "nvidia/Cosmos-Reason2-2B",
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {
-                "role": "user",
-                "content": [
-                    content_item,
-                    {"type": "text", "text": user_prompt}
-                ]
-            }
-        ],
-        "max_tokens": 4096,
-        "temperature": 0.7
-    }
-    
-    print(f"🚀 Sending to server at {WORKSTATION_IP}:8000...")
+    print(f"🚀 Sending to server at {client.host}:{client.port}...")
     if yaml_file:
         print(f"💭 Using YAML prompt: {yaml_file}")
     else:
@@ -170,104 +677,163 @@ def process_file(file_path, prompt=None, yaml_file=None, show_reasoning=True):
     print()
     
     # Send request
-    try:
-        response = requests.post(API_URL, json=request_data, timeout=180)
-        response.raise_for_status()
-        
-        result = response.json()
-        content = result['choices'][0]['message']['content']
-        
+    request_data = build_request(
+        system_prompt, user_prompt, file_type, FILE_URL_PLACEHOLDER,
+        max_tokens=max_tokens, temperature=temperature
+    )
+    content = client.chat_file(request_data, file_path, mime_type, binary, use_cache)
+    
+    if content is not None:
         display_result(content, show_reasoning)
-        return content
-        
-    except requests.exceptions.ConnectionError:
-        print(f"❌ Error: Cannot connect to server at {WORKSTATION_IP}:8000")
-        print("   Make sure the vLLM server is running on your workstation.")
-        return None
-    except requests.exceptions.Timeout:
-        print("❌ Error: Request timed out.")
-        return None
-    except requests.exceptions.HTTPError as e:
-        print(f"❌ HTTP Error: {e}")
-        return None
-    except KeyError as e:
-        print(f"❌ Error parsing response: {e}")
-        return None
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        return None
+    return content
 
-def test_connection():
+def test_connection(client=None):
     """Test connection to the server"""
-    print(f"🔍 Testing connection to {WORKSTATION_IP}:8000...")
+    client = client or CLIENT
+    print(f"🔍 Testing connection to {client.host}:{client.port}...")
     try:
-        response = requests.get(f"http://{WORKSTATION_IP}:8000/v1/models", timeout=5)
-        response.raise_for_status()
-        models = response.json()
+        models = client.list_models()
         print(f"✅ Connected! Available models:")
-        for model in models.get('data', []):
+        for model in models:
             print(f"   • {model.get('id', 'unknown')}")
         return True
     except Exception as e:
         print(f"❌ Connection failed: {e}")
-        print(f"   Make sure vLLM server is running at {WORKSTATION_IP}:8000")
+        print(f"   Make sure vLLM server is running at {client.host}:{client.port}")
         return False
 
-def show_usage():
-    """Display usage information"""
-    print(__doc__)
-    print("\nFlags:")
-    print("  --prompt-file FILE    Load prompt from YAML file")
-    print("  --no-reasoning        Hide <think> sections if present")
-    print()
-    print("Common Use Cases:")
-    print("  Test connection:        python3 cosmos_client.py test")
-    print("  Quick analysis:         python3 cosmos_client.py video.mp4")
-    print("  Custom prompt:          python3 cosmos_client.py image.jpg 'Describe this'")
-    print("  Use YAML template:      python3 cosmos_client.py video.mp4 --prompt-file prompts/caption.yaml")
-    print()
+def server_address(value):
+    """argparse type for HOST[:PORT], returning (host, port)"""
+    host, _, port = value.partition(':')
+    if not host:
+        raise argparse.ArgumentTypeError(f"missing host in {value!r}")
+    if not port:
+        return host, 8000
+    if not port.isdigit() or not 0 < int(port) < 65536:
+        raise argparse.ArgumentTypeError(f"invalid port in {value!r}")
+    return host, int(port)
+
+def build_parser():
+    """Build the command-line parser"""
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Common Use Cases:
+  Test connection:        python3 cosmos_client.py test
+  Other server:           python3 cosmos_client.py video.mp4 --server 192.168.1.20:8000
+  Quick analysis:         python3 cosmos_client.py video.mp4
+  Custom prompt:          python3 cosmos_client.py image.jpg 'Describe this'
+  Use YAML template:      python3 cosmos_client.py video.mp4 --prompt-file prompts/caption.yaml
+  Deterministic answer:   python3 cosmos_client.py image.jpg --temperature 0 --max-tokens 256
+        """
+    )
+    
+    parser.add_argument(
+        'file_path',
+        nargs='?',
+        help="Image or video to analyze ('test' checks the server connection)"
+    )
+    
+    parser.add_argument(
+        'prompt',
+        nargs='*',
+        help='Custom prompt (ignored when --prompt-file is given)'
+    )
+    
+    parser.add_argument(
+        '--test',
+        action='store_true',
+        help='Test the connection to the server and exit'
+    )
+    
+    parser.add_argument(
+        '--server',
+        metavar='HOST[:PORT]',
+        type=server_address,
+        default=None,
+        help=f'vLLM server address (default: {WORKSTATION_IP}:8000)'
+    )
+    
+    parser.add_argument(
+        '--prompt-file',
+        metavar='FILE',
+        default=None,
+        help='Load prompt from YAML file'
+    )
+    
+    parser.add_argument(
+        '--no-reasoning',
+        action='store_true',
+        help='Hide <think> sections if present'
+    )
+    
+    parser.add_argument(
+        '--binary',
+        action='store_true',
+        help='Let the server download the raw file instead of sending base64'
+    )
+    
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Always query the server, ignoring cached responses'
+    )
+    
+    parser.add_argument(
+        '--max-tokens',
+        type=int,
+        default=4096,
+        help='Maximum number of tokens to generate (default: 4096)'
+    )
+    
+    parser.add_argument(
+        '--temperature',
+        type=float,
+        default=0.7,
+        help='Sampling temperature; 0 is deterministic and cacheable (default: 0.7)'
+    )
+    
+    return parser
 
 def main():
     """Main entry point"""
+    parser = build_parser()
+    # Intermixed so prompt words may come before or after options
+    args = parser.parse_intermixed_args()
     
-    if len(sys.argv) < 2:
-        show_usage()
-        sys.exit(1)
-    
-    # Special commands
-    if sys.argv[1] in ['-h', '--help', 'help']:
-        show_usage()
-        sys.exit(0)
+    if args.server:
+        client = CosmosClient(*args.server)
+    else:
+        client = CLIENT
     
-    if sys.argv[1] in ['test', '--test']:
-        test_connection()
+    # Special commands ('test' and 'help' kept as positionals for compatibility)
+    if args.test or args.file_path == 'test':
+        test_connection(client)
         sys.exit(0)
     
-    # Parse flags
-    show_reasoning = '--no-reasoning' not in sys.argv
-    args = [arg for arg in sys.argv[1:] if arg != '--no-reasoning']
-    
-    # Check for --prompt-file flag
-    yaml_file = None
-    if '--prompt-file' in args:
-        idx = args.index('--prompt-file')
-        if idx + 1 < len(args):
-            yaml_file = args[idx + 1]
-            args = args[:idx] + args[idx+2:]
-        else:
-            print("❌ Error: --prompt-file requires a file path")
-            sys.exit(1)
-    
-    if len(args) < 1:
-        print("❌ Error: No file specified")
-        show_usage()
+    if args.file_path is None:
+        parser.print_help()
         sys.exit(1)
     
-    file_path = args[0]
-    custom_prompt = ' '.join(args[1:]) if len(args) > 1 and not yaml_file else None
+    if args.file_path == 'help':
+        parser.print_help()
+        sys.exit(0)
+    
+    custom_prompt = ' '.join(args.prompt) if args.prompt and not args.prompt_file else None
     
     # Process the file
-    result = process_file(file_path, custom_prompt, yaml_file, show_reasoning)
+    result = process_file(
+        args.file_path,
+        custom_prompt,
+        args.prompt_file,
+        show_reasoning=not args.no_reasoning,
+        binary=args.binary,
+        use_cache=not args.no_cache,
+        max_tokens=args.max_tokens,
+        temperature=args.temperature,
+        client=client
+    )
     
     if result is None:
         sys.exit(1)
@@ -1,28 +1,93 @@
-import subprocess
 import json
 import argparse
+import csv
+import collections
 from pathlib import Path
-import pandas as pd
 from datetime import datetime
 import re
+import io
+import sys
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def evaluate_video(video_path):
-    """Evaluate a single video - get clean output"""
-    cmd = [
-        "cosmos-reason2-inference", "online",  # Removed -v flag
-        "--port", "8000",
-        "--prompt", "Does this video conform to real world physics? Analyze the motion, interactions, and physical behaviors shown. Point out any violations of physical laws or unrealistic elements.",
-        "--reasoning",
-        "--videos", str(video_path),
-        "--fps", "4"
-    ]
+from cosmos_client import (
+    FILE_URL_PLACEHOLDER, VIDEO_EXT, AsyncCosmosClient, CosmosClient, build_request, hash_file, httpx
+)
+
+# Identical for every video so vLLM can serve this prefix from its cache
+SYSTEM_PROMPT = "You are a helpful assistant."
+PHYSICS_PROMPT = (
+    "Does this video conform to real world physics? Analyze the motion, interactions, "
+    "and physical behaviors shown. Point out any violations of physical laws or unrealistic elements."
+)
+# Verdict-only prompt for --fast: no chain-of-thought, just a one-word answer
+VERDICT_PROMPT = "Does this video conform to real world physics? Answer with only YES or NO."
+VERDICT_MAX_TOKENS = 8
+REASONING_FORMAT = (
+    "Answer the question in the following format: "
+    "<think>\nyour reasoning\n</think>\n\n<answer>\nyour answer\n</answer>."
+)
+
+# First word of the answer, and the reasoning, in the model's response
+ASSISTANT_RE = re.compile(r'<answer>\s*(\w+)', re.IGNORECASE)
+FIRST_WORD_RE = re.compile(r'^\s*(\w+)')
+
+# The answer word is complete once a non-word character follows it
+ANSWER_READY_RE = re.compile(r'<answer>\s*\w+\W', re.IGNORECASE)
+FIRST_WORD_READY_RE = re.compile(r'^\s*\w+\W')
+REASONING_RE = re.compile(r'<think>(.*?)</think>', re.DOTALL | re.IGNORECASE)
+
+CSV_FIELDS = ['video', 'video_path', 'verdict', 'answer', 'reasoning', 'timestamp']
+
+# Serializes progress output from worker threads
+print_lock = threading.Lock()
+
+def build_evaluation_request(fps=4, with_reasoning=True, max_tokens=512):
+    """Build the physics evaluation request, with FILE_URL_PLACEHOLDER for the video
     
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    output = result.stdout
+    Video tokens scale with fps, so a lower fps means less prefill. With
+    with_reasoning=False the model answers YES/NO without a chain-of-thought,
+    which cuts decoding to a few tokens.
     
-    # Parse the cleaner output - look for Assistant: section
-    assistant_match = re.search(r'Assistant:\s*(\w+)', output)
-    reasoning_match = re.search(r'Reasoning:\s*(.*?)(?:--------------------\s*Assistant:|$)', output, re.DOTALL)
+    Sampling is greedy (temperature 0), so verdicts are reproducible and
+    repeat runs can be answered from the response cache. The response is
+    streamed and generation stops at </answer>; see verdict_ready for how
+    the client stops reading even earlier.
+    """
+    if with_reasoning:
+        user_prompt = f"{PHYSICS_PROMPT}\n{REASONING_FORMAT}"
+    else:
+        user_prompt = VERDICT_PROMPT
+    
+    request_data = build_request(
+        SYSTEM_PROMPT, user_prompt, 'video', FILE_URL_PLACEHOLDER,
+        max_tokens=max_tokens if with_reasoning else VERDICT_MAX_TOKENS,
+        temperature=0
+    )
+    request_data["mm_processor_kwargs"] = {"fps": fps}
+    request_data["stream"] = True
+    request_data["stop"] = ["</answer>"]
+    return request_data
+
+def verdict_ready(output, with_reasoning=True):
+    """True once a streamed response contains the complete answer word
+    
+    Only that word decides the verdict, so the stream can be closed here
+    and the server stops decoding the rest of the answer.
+    """
+    pattern = ANSWER_READY_RE if with_reasoning else FIRST_WORD_READY_RE
+    return pattern.search(output) is not None
+
+def parse_evaluation(output, with_reasoning=True):
+    """Turn a model response into (verdict, output, answer, reasoning)"""
+    # Parse the <answer> and <think> sections (or the bare answer)
+    if with_reasoning:
+        assistant_match = ASSISTANT_RE.search(output)
+        reasoning_match = REASONING_RE.search(output)
+    else:
+        assistant_match = FIRST_WORD_RE.search(output)
+        reasoning_match = None
     
     if assistant_match:
         answer = assistant_match.group(1).strip()
@@ -38,17 +103,56 @@ def evaluate_video(video_path):
         reasoning = "N/A"
     
     # Decision based on answer
-    if 'YES' in answer_upper:
+    if answer_upper == 'YES':
         verdict = "PASS"
-    elif 'NO' in answer_upper:
+    elif answer_upper == 'NO':
         verdict = "FAIL"
     else:
         verdict = "UNCLEAR"
     
     return verdict, output, answer, reasoning
 
-def batch_evaluate(video_folder, output_folder=None, verbose=False):
-    """Batch evaluate all videos in folder"""
+def evaluate_video(video_path, client, use_cache=True, fps=4, with_reasoning=True, max_tokens=512,
+                   file_hash=None):
+    """Evaluate a single video with a direct request to the vLLM server"""
+    request_data = build_evaluation_request(fps, with_reasoning, max_tokens)
+    output = client.chat_file(
+        request_data, video_path, 'video/mp4', use_cache=use_cache, file_hash=file_hash,
+        stop_when=lambda content: verdict_ready(content, with_reasoning)
+    ) or ""
+    return parse_evaluation(output, with_reasoning)
+
+async def evaluate_video_async(video_path, client, use_cache=True, fps=4, with_reasoning=True, max_tokens=512,
+                               file_hash=None):
+    """Evaluate a single video using an AsyncCosmosClient"""
+    request_data = build_evaluation_request(fps, with_reasoning, max_tokens)
+    output = await client.chat_file(
+        request_data, video_path, 'video/mp4', use_cache=use_cache, file_hash=file_hash,
+        stop_when=lambda content: verdict_ready(content, with_reasoning)
+    ) or ""
+    return parse_evaluation(output, with_reasoning)
+
+async def evaluate_all_async(groups, port, concurrency, on_result, **options):
+    """Evaluate groups of identical videos concurrently on one event loop
+    
+    groups maps file hash -> paths; on_result(paths, result) is called once per group.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async with AsyncCosmosClient(port=port) as client:
+        async def evaluate(file_hash, paths):
+            async with semaphore:
+                result = await evaluate_video_async(paths[0], client, file_hash=file_hash, **options)
+            on_result(paths, result)
+        
+        await asyncio.gather(*(evaluate(file_hash, paths) for file_hash, paths in groups.items()))
+
+def batch_evaluate(video_folder, output_folder=None, verbose=False, concurrency=4, port=8000, use_cache=True,
+                   fps=4, with_reasoning=True, max_tokens=512):
+    """Batch evaluate all videos in folder, running up to `concurrency` at once
+    
+    Uses asyncio with httpx when it is installed, otherwise a thread pool.
+    """
     video_folder = Path(video_folder)
     
     # Use input folder for output if not specified
@@ -58,78 +162,145 @@ def batch_evaluate(video_folder, output_folder=None, verbose=False):
         output_folder = Path(output_folder)
         output_folder.mkdir(parents=True, exist_ok=True)
     
-    videos = list(video_folder.glob("*.mp4"))
+    # Single pass, case-insensitive (.MP4, .mov, ...); a missing folder has no videos
+    videos = sorted(
+        path for path in video_folder.iterdir()
+        if path.suffix.lower() in VIDEO_EXT and path.is_file()
+    ) if video_folder.is_dir() else []
     
     if not videos:
-        print(f"?  No MP4 files found in {video_folder}")
+        print(f"?  No video files found in {video_folder}")
         return None
     
     results = []
+    counts = collections.Counter()
+    videos_by_verdict = {'PASS': [], 'FAIL': [], 'UNCLEAR': []}
+    
+    # Rows are written as they complete, so partial results survive a crash
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    output_file = output_folder / f"evaluation_{timestamp}.csv"
     
     print(f"? Processing {len(videos)} videos from: {video_folder}")
-    print(f"? Output will be saved to: {output_folder}\n")
+    print(f"? Output will be saved to: {output_file}")
+    print(f"? Running {concurrency} evaluations at a time")
+    
+    # Hash each video once; identical files are evaluated once and share the result
+    groups = {}
+    unreadable = []
+    for video in videos:
+        try:
+            groups.setdefault(hash_file(video), []).append(video)
+        except OSError as e:
+            print(f"?  Could not read {video.name}: {e}")
+            unreadable.append((video, e))
+    duplicates = len(videos) - len(unreadable) - len(groups)
+    if duplicates:
+        print(f"? {duplicates} duplicate videos will reuse earlier results")
+    print()
+    
+    options = {
+        'use_cache': use_cache,
+        'fps': fps,
+        'with_reasoning': with_reasoning,
+        'max_tokens': max_tokens
+    }
     
-    for i, video in enumerate(videos, 1):
-        print(f"[{i}/{len(videos)}] Evaluating: {video.name}")
-        verdict, full_output, answer, reasoning = evaluate_video(video)
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
         
-        results.append({
-            'video': video.name,
-            'video_path': str(video),
-            'verdict': verdict,
-            'answer': answer,
-            'reasoning': reasoning,
-            'timestamp': datetime.now().isoformat()
-        })
+        def record(paths, result):
+            verdict, full_output, answer, reasoning = result
+            
+            for video in paths:
+                row = {
+                    'video': video.name,
+                    'video_path': str(video),
+                    'verdict': verdict,
+                    'answer': answer,
+                    'reasoning': reasoning,
+                    'timestamp': datetime.now().isoformat()
+                }
+                writer.writerow(row)
+                
+                results.append(row)
+                counts[verdict] += 1
+                videos_by_verdict[verdict].append(video.name)
+            f.flush()
+            
+            progress = (
+                f"[{len(results)}/{len(videos)}] Evaluated: {', '.join(video.name for video in paths)}\n"
+                f"  ? Answer: {answer}\n"
+                f"  ? Verdict: {verdict}\n"
+            )
+            
+            # Show snippet if verbose
+            if verbose:
+                progress += f"  ? Reasoning: {reasoning[:200]}...\n"
+            
+            with print_lock:
+                sys.stdout.write(progress + "\n")
         
-        print(f"  ? Answer: {answer}")
-        print(f"  ? Verdict: {verdict}")
+        # Unreadable files still get a row, marked UNCLEAR
+        for video, error in unreadable:
+            record([video], ("UNCLEAR", "", "ERROR", f"Could not read file: {error}"))
         
-        # Show snippet if verbose
-        if verbose:
-            print(f"  ? Reasoning: {reasoning[:200]}...")
-        print()
+        if httpx is not None:
+            # All requests share one async connection pool on a single thread
+            asyncio.run(evaluate_all_async(groups, port, concurrency, record, **options))
+        else:
+            # Each evaluation mostly waits on the server, so threads are enough.
+            # They share one connection pool, keeping connections to vLLM alive.
+            client = CosmosClient(port=port)
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                futures = {
+                    executor.submit(evaluate_video, paths[0], client, file_hash=file_hash, **options): paths
+                    for file_hash, paths in groups.items()
+                }
+                for future in as_completed(futures):
+                    record(futures[future], future.result())
     
-    # Create DataFrame
-    df = pd.DataFrame(results)
+    # Build the summary in memory and print it with a single write
+    summary = io.StringIO()
+    summary.write("\n" + "="*50 + "\n")
+    summary.write("EVALUATION SUMMARY\n")
+    summary.write("="*50 + "\n")
+    total = len(results)
+    passed = counts['PASS']
+    failed = counts['FAIL']
+    unclear = counts['UNCLEAR']
     
-    # Save to CSV in the specified output folder
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    output_file = output_folder / f"evaluation_{timestamp}.csv"
-    df.to_csv(output_file, index=False)
-    
-    # Print summary
-    print("\n" + "="*50)
-    print("EVALUATION SUMMARY")
-    print("="*50)
-    total = len(df)
-    passed = (df['verdict'] == 'PASS').sum()
-    failed = (df['verdict'] == 'FAIL').sum()
-    unclear = (df['verdict'] == 'UNCLEAR').sum()
-    
-    print(f"Total:      {total}")
-    print(f"? PASS:    {passed} ({passed/total*100:.1f}%)")
-    print(f"? FAIL:    {failed} ({failed/total*100:.1f}%)")
-    print(f"? UNCLEAR: {unclear} ({unclear/total*100:.1f}%)")
-    print("="*50)
+    summary.write(f"Total:      {total}\n")
+    summary.write(f"? PASS:    {passed} ({passed/total*100:.1f}%)\n")
+    summary.write(f"? FAIL:    {failed} ({failed/total*100:.1f}%)\n")
+    summary.write(f"? UNCLEAR: {unclear} ({unclear/total*100:.1f}%)\n")
+    summary.write("="*50 + "\n")
     
     # Show which videos passed vs failed
-    print("\n? PASSED:")
-    for _, row in df[df['verdict'] == 'PASS'].iterrows():
-        print(f"   ? {row['video']}")
+    summary.write("\n? PASSED:\n")
+    summary.write("".join(f"   ? {name}\n" for name in videos_by_verdict['PASS']))
     
-    print("\n? FAILED:")
-    for _, row in df[df['verdict'] == 'FAIL'].iterrows():
-        print(f"   ? {row['video']}")
+    summary.write("\n? FAILED:\n")
+    summary.write("".join(f"   ? {name}\n" for name in videos_by_verdict['FAIL']))
     
     if unclear > 0:
-        print("\n? UNCLEAR:")
-        for _, row in df[df['verdict'] == 'UNCLEAR'].iterrows():
-            print(f"   ? {row['video']}")
+        summary.write("\n? UNCLEAR:\n")
+        summary.write("".join(f"   ? {name}\n" for name in videos_by_verdict['UNCLEAR']))
+    
+    summary.write(f"\n? Results saved to: {output_file}\n")
     
-    print(f"\n? Results saved to: {output_file}")
+    with print_lock:
+        sys.stdout.write(summary.getvalue())
+        sys.stdout.flush()
     
-    return df
+    return results
+
+def positive_int(value):
+    """argparse type for integers >= 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
 
 def main():
     parser = argparse.ArgumentParser(
@@ -147,7 +318,7 @@ Examples:
         '-i', '--input-folder',
         type=str,
         required=True,
-        help='Path to folder containing MP4 videos to evaluate'
+        help='Path to folder containing videos to evaluate'
     )
     
     parser.add_argument(
@@ -163,6 +334,13 @@ Examples:
         help='Show reasoning snippets during processing'
     )
     
+    parser.add_argument(
+        '-c', '--concurrency',
+        type=positive_int,
+        default=4,
+        help='Number of videos to evaluate concurrently (default: 4)'
+    )
+    
     parser.add_argument(
         '--port',
         type=int,
@@ -170,12 +348,40 @@ Examples:
         help='vLLM server port (default: 8000)'
     )
     
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Always query the server, ignoring cached responses'
+    )
+    
+    parser.add_argument(
+        '--fast',
+        action='store_true',
+        help='Verdict only: skip reasoning and sample at 2 fps unless --fps is given'
+    )
+    
+    parser.add_argument(
+        '--fps',
+        type=int,
+        default=None,
+        help='Frames per second sampled from each video (default: 4, or 2 with --fast)'
+    )
+    
+    parser.add_argument(
+        '--max-tokens',
+        type=int,
+        default=512,
+        help='Maximum tokens generated per video with reasoning (default: 512)'
+    )
+    
     args = parser.parse_args()
+    fps = args.fps or (2 if args.fast else 4)
     
     # Run batch evaluation
-    df = batch_evaluate(args.input_folder, args.output_folder, args.verbose)
+    results = batch_evaluate(args.input_folder, args.output_folder, args.verbose, args.concurrency, args.port, not args.no_cache,
+                             fps, not args.fast, args.max_tokens)
     
-    if df is not None:
+    if results is not None:
         print("\n? Evaluation complete!")
 
 if __name__ == "__main__":